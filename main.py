@@ -1,5 +1,5 @@
 import logging
-from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File, Form, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File, Form, BackgroundTasks, Query
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -31,6 +31,10 @@ AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET", "srtstreamer-content-bucket")
 AWS_REGION = os.getenv("AWS_REGION", "eu-west-1")
 AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
+# Probe metadata index, stored as a JSON object in the same bucket
+MEDIA_INDEX_KEY = os.getenv("MEDIA_INDEX_KEY", ".media-index.json")
+FFPROBE_TIMEOUT = int(os.getenv("FFPROBE_TIMEOUT", "60"))
+MEDIA_INDEX_SAVE_EVERY = int(os.getenv("MEDIA_INDEX_SAVE_EVERY", "25"))  # Backfill probes between index saves
 
 app = FastAPI()
 security = HTTPBasic()
@@ -66,10 +70,21 @@ playlists = {}  # Store playlists in memory
 stream_bandwidth = {}  
 # Store file expiry timestamps
 file_expiry_map = {}
+# Probe metadata per S3 key, loaded from MEDIA_INDEX_KEY on first use
+media_index = {}
+media_index_loaded = False
+media_index_lock = threading.Lock()
+# Serialises index writes so an older snapshot never overwrites a newer one in S3
+media_index_save_lock = threading.Lock()
+media_index_backfill_running = False
 
 # Media files directory for local files
 TEMP_DIR = os.getenv("TEMP_DIR", "./temp")
 
+# Relay input settings
+RELAY_IO_TIMEOUT = int(os.getenv("RELAY_IO_TIMEOUT", "5"))  # Seconds without input before reconnecting
+RELAY_RECONNECT_DELAY_MAX = int(os.getenv("RELAY_RECONNECT_DELAY_MAX", "10"))
+
 # Ensure the directories exist
 os.makedirs(TEMP_DIR, exist_ok=True)
 # Set up logging
@@ -77,8 +92,9 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class StreamRequest(BaseModel):
-    input_type: Literal['file', 'url']
+    input_type: Literal['file', 'url', 'relay']
     file: Optional[str] = None
+    stream_url: Optional[str] = None  # Live source for relay input (srt://, udp:// or HLS .m3u8)
     duration: int
     destination: list[str]  # Can be single or a comma-separated list for redundancy
     start_offset: int = 0
@@ -106,7 +122,7 @@ def list_s3_files():
     try:
         response = s3_client.list_objects_v2(Bucket=AWS_S3_BUCKET)
         if "Contents" in response:
-            file_list = [obj["Key"] for obj in response["Contents"]]
+            file_list = [obj["Key"] for obj in response["Contents"] if obj["Key"] != MEDIA_INDEX_KEY]
             logger.info(f"Found {len(file_list)} files in S3.")
             return file_list
         else:
@@ -117,6 +133,210 @@ def list_s3_files():
         return []
     
 
+def load_media_index():
+    """
+    Loads the probe metadata index from S3 once; later calls use the in-memory copy.
+    Returns False if the index could not be read, in which case it must not be saved.
+    """
+    global media_index_loaded
+    with media_index_lock:
+        if media_index_loaded:
+            return True
+        try:
+            response = s3_client.get_object(Bucket=AWS_S3_BUCKET, Key=MEDIA_INDEX_KEY)
+            media_index.update(json.loads(response["Body"].read()))
+            logger.info(f"Loaded media index with {len(media_index)} entries from S3.")
+        except s3_client.exceptions.NoSuchKey:
+            logger.info("No media index found in S3, starting with an empty index.")
+        except Exception as e:
+            logger.error(f"Failed to load media index from S3: {e}")
+            return False
+        media_index_loaded = True
+        return True
+
+
+def save_media_index():
+    """Writes the in-memory probe metadata index back to S3."""
+    if not media_index_loaded:
+        logger.error("Media index was never loaded from S3; refusing to overwrite it.")
+        return
+    with media_index_save_lock:
+        with media_index_lock:
+            body = json.dumps(media_index, separators=(",", ":"))
+            entries = len(media_index)
+        try:
+            s3_client.put_object(Bucket=AWS_S3_BUCKET, Key=MEDIA_INDEX_KEY, Body=body.encode("utf-8"),
+                                 ContentType="application/json")
+            logger.info(f"Saved media index with {entries} entries to S3.")
+        except Exception as e:
+            logger.error(f"Failed to save media index to S3: {e}")
+
+
+def parse_frame_rate(rate):
+    """Converts an ffprobe rational such as '30000/1001' to frames per second."""
+    try:
+        num, den = rate.split("/")
+        return round(int(num) / int(den), 3) if int(den) else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def probe_media_file(s3_key, etag=None):
+    """
+    Runs a single ffprobe pass against a presigned S3 URL, so only the byte ranges the
+    demuxer seeks to are fetched, and returns a compact metadata entry.
+    """
+    url = s3_client.generate_presigned_url(
+        "get_object", Params={"Bucket": AWS_S3_BUCKET, "Key": s3_key}, ExpiresIn=FFPROBE_TIMEOUT * 2
+    )
+    probe_cmd = [
+        "ffprobe", "-v", "error", "-of", "json",
+        "-show_entries",
+        "format=format_name,duration,size,bit_rate:"
+        "stream=codec_type,codec_name,profile,width,height,avg_frame_rate,pix_fmt,channels,sample_rate",
+        url
+    ]
+    entry = {"etag": etag, "probed_at": datetime.utcnow().isoformat()}
+    try:
+        result = subprocess.run(probe_cmd, capture_output=True, timeout=FFPROBE_TIMEOUT)
+        if result.returncode != 0:
+            raise Exception(result.stderr.decode("utf-8", errors="ignore").strip() or "ffprobe failed")
+        probe = json.loads(result.stdout)
+    except Exception as e:
+        logger.error(f"Failed to probe {s3_key}: {e}")
+        entry["error"] = str(e)
+        return entry
+
+    fmt = probe.get("format", {})
+    entry.update({
+        "format": fmt.get("format_name"),
+        "duration": round(float(fmt["duration"]), 3) if fmt.get("duration") else None,
+        "size": int(fmt["size"]) if fmt.get("size") else None,
+        "bitrate": int(fmt["bit_rate"]) if fmt.get("bit_rate") else None,
+        "video": None,
+        "audio": []
+    })
+    for stream in probe.get("streams", []):
+        if stream.get("codec_type") == "video" and entry["video"] is None:
+            entry["video"] = {
+                "codec": stream.get("codec_name"),
+                "profile": stream.get("profile"),
+                "width": stream.get("width"),
+                "height": stream.get("height"),
+                "fps": parse_frame_rate(stream.get("avg_frame_rate")),
+                "pix_fmt": stream.get("pix_fmt")
+            }
+        elif stream.get("codec_type") == "audio":
+            entry["audio"].append({
+                "codec": stream.get("codec_name"),
+                "channels": stream.get("channels"),
+                "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None
+            })
+    return entry
+
+
+def index_media_file(s3_key, etag=None):
+    """Probes a single S3 object and stores the result in the persisted index."""
+    if not load_media_index():
+        logger.error(f"Skipping probe of {s3_key}: media index is unavailable. Run a backfill once S3 recovers.")
+        return
+    if etag is None:
+        try:
+            etag = s3_client.head_object(Bucket=AWS_S3_BUCKET, Key=s3_key)["ETag"]
+        except Exception as e:
+            logger.error(f"Failed to read metadata for {s3_key} from S3: {e}")
+    entry = probe_media_file(s3_key, etag)
+    with media_index_lock:
+        media_index[s3_key] = entry
+    save_media_index()
+
+
+def backfill_media_index(force=False):
+    """Probes every S3 object missing from the index (or changed since it was probed) and drops stale entries."""
+    global media_index_backfill_running
+    try:
+        run_media_index_backfill(force)
+    finally:
+        media_index_backfill_running = False
+
+
+def run_media_index_backfill(force):
+    """Runs one backfill pass over every page of the bucket listing, saving the index as it goes."""
+    if not load_media_index():
+        logger.error("Media index backfill aborted: the existing index could not be loaded from S3.")
+        return
+    # Only entries that existed before listing can be stale; uploads indexed during the run must survive pruning
+    with media_index_lock:
+        indexed_before_listing = set(media_index)
+    objects = {}
+    try:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=AWS_S3_BUCKET):
+            for obj in page.get("Contents", []):
+                if obj["Key"] != MEDIA_INDEX_KEY:
+                    objects[obj["Key"]] = obj.get("ETag")
+    except Exception as e:
+        logger.error(f"Failed to list S3 objects for media index backfill: {e}")
+        return
+
+    probed = 0
+    for s3_key, etag in objects.items():
+        existing = media_index.get(s3_key)
+        # Failed probes (timeouts, S3 or network errors) are retried on every backfill
+        if not force and existing and not existing.get("error") and existing.get("etag") == etag:
+            continue
+        entry = probe_media_file(s3_key, etag)
+        with media_index_lock:
+            media_index[s3_key] = entry
+        probed += 1
+        if probed % MEDIA_INDEX_SAVE_EVERY == 0:
+            # Keep finished probes if the service restarts during a long backfill
+            save_media_index()
+
+    with media_index_lock:
+        stale = [s3_key for s3_key in indexed_before_listing if s3_key in media_index and s3_key not in objects]
+        for s3_key in stale:
+            media_index.pop(s3_key)
+    logger.info(f"Media index backfill probed {probed} files and removed {len(stale)} stale entries.")
+    save_media_index()
+
+
+def filter_media_files(files, codec=None, resolution=None, min_duration=None, max_duration=None):
+    """
+    Pairs each file with its index entry and applies the listing filters.
+    Files without a usable index entry are only returned when no filter is set.
+    """
+    load_media_index()
+    index = media_index
+    filtering = any(value is not None for value in (codec, resolution, min_duration, max_duration))
+    width = height = None
+    if resolution:
+        match = re.fullmatch(r"(\d+)x(\d+)", resolution)
+        if not match:
+            raise HTTPException(status_code=400, detail="resolution must be formatted as WIDTHxHEIGHT, e.g. 1920x1080")
+        width, height = int(match.group(1)), int(match.group(2))
+
+    results = []
+    for s3_key in files:
+        entry = index.get(s3_key)
+        if filtering:
+            if not entry or entry.get("error"):
+                continue
+            video = entry.get("video") or {}
+            codecs = {video.get("codec")} | {audio.get("codec") for audio in entry.get("audio", [])}
+            duration = entry.get("duration")
+            if codec and codec.lower() not in codecs:
+                continue
+            if resolution and (video.get("width"), video.get("height")) != (width, height):
+                continue
+            if min_duration is not None and (duration is None or duration < min_duration):
+                continue
+            if max_duration is not None and (duration is None or duration > max_duration):
+                continue
+        results.append({"file": s3_key, "metadata": entry})
+    return results
+
+
 def download_file_in_background(url, stream_id, destination, duration):
     filename = os.path.join(TEMP_DIR, str(uuid.uuid4()) + os.path.basename(urlparse(url).path))
     stream_status[stream_id] = {"status": "Downloading", "file": filename, "destination": destination}
@@ -361,6 +581,269 @@ def download_file_from_s3(s3_key):
     
 
 
+def is_relay_source(url):
+    """Returns True if the URL points to a live source that can be relayed as-is."""
+    if not url:
+        return False
+    parsed = urlparse(url)
+    if parsed.scheme in ("srt", "udp"):
+        return True
+    return parsed.scheme in ("http", "https") and parsed.path.endswith(".m3u8")
+
+
+def build_relay_command(source_url, outputs):
+    """
+    Builds an ffmpeg command that copies the live source TS to every output without re-encoding.
+    Outputs go through the tee muxer, so one failing destination doesn't stop the others.
+    """
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostdin",
+        # Broadcast feeds often carry private data PIDs ffmpeg cannot map; skip them instead of exiting
+        "-ignore_unknown",
+        "-rw_timeout", str(RELAY_IO_TIMEOUT * 1000000),
+        "-fflags", "+genpts+discardcorrupt",
+    ]
+    if urlparse(source_url).scheme in ("http", "https"):
+        # SRT and UDP senders pace themselves; HLS segments would otherwise be pulled at line rate
+        cmd += ["-re"]
+    cmd += ["-i", source_url]
+    tee_outputs = "|".join(
+        "[f=mpegts:onfail=ignore]" + re.sub(r"([\\|'\[\]])", r"\\\1", output.strip()) for output in outputs
+    )
+    cmd += ["-map", "0", "-c", "copy", "-f", "tee", tee_outputs]
+    cmd += ["-progress", "pipe:2", "-loglevel", "warning"]
+    return cmd
+
+
+# ffmpeg messages that point at the source; checked first since they can mention the output file too
+RELAY_INPUT_ERROR_MARKERS = ["[in#", "Error opening input", "Nothing was written into output file"]
+# ffmpeg messages that point at a failing destination rather than the source
+RELAY_OUTPUT_ERROR_MARKERS = [
+    "Error opening output", "av_interleaved_write_frame", "Error writing trailer",
+    "Could not write header", "Slave muxer", "tee outputs failed"
+]
+
+
+def is_relay_output_error(errors, source_url, destinations):
+    """Decides from the last ffmpeg error lines whether the relay exited because of an output."""
+    for line in errors:
+        if source_url in line or any(marker in line for marker in RELAY_INPUT_ERROR_MARKERS):
+            return False
+    for line in errors:
+        if any(marker in line for marker in RELAY_OUTPUT_ERROR_MARKERS):
+            return True
+        if any(destination.strip() in line for destination in destinations):
+            return True
+    return False
+
+
+def monitor_relay_process(process, stream_id, destinations, bytes_before=0):
+    """
+    Reads the relay ffmpeg progress output and records input and output stats.
+    ffmpeg only reports progress for what it writes, so byte and bitrate figures are
+    output-side; with stream copy they track the source closely.
+    Returns the last error lines once the ffmpeg process closes stderr.
+    """
+    bitrate_pattern = re.compile(r"bitrate=\s*(\d+\.?\d*)")
+    errors = []
+    max_error_lines = 5
+    input_stats = stream_status.get(stream_id, {}).get("input")
+    output_stats = stream_status.get(stream_id, {}).get("output")
+    if input_stats is None or output_stats is None:
+        return errors
+    if stream_id not in stream_bandwidth:
+        stream_bandwidth[stream_id] = {}
+
+    for line in iter(process.stderr.readline, b""):
+        decoded_line = line.decode("utf-8", errors="ignore").strip()
+
+        if decoded_line.startswith("total_size="):
+            value = decoded_line.split("=", 1)[1]
+            if value.isdigit():
+                output_stats["bytes_sent"] = bytes_before + int(value)
+        elif decoded_line.startswith("out_time_us=") or decoded_line.startswith("out_time_ms="):
+            # Both keys are reported in microseconds by ffmpeg
+            value = decoded_line.split("=", 1)[1]
+            if value.isdigit():
+                output_stats["session_time"] = round(int(value) / 1000000, 1)
+        elif decoded_line.startswith("speed="):
+            output_stats["speed"] = decoded_line.split("=", 1)[1]
+        elif decoded_line.startswith("progress="):
+            if input_stats["state"] != "connected":
+                input_stats["state"] = "connected"
+                input_stats["connected_at"] = datetime.utcnow().isoformat()
+                logger.info(f"Relay stream {stream_id} connected to source {input_stats['source']}")
+        elif "bitrate=" in decoded_line:
+            match = bitrate_pattern.search(decoded_line)
+            if match:
+                bandwidth_mbps = round(float(match.group(1)) / 1000, 2)
+                output_stats["bitrate_mbps"] = bandwidth_mbps
+                for destination in destinations:
+                    stream_bandwidth[stream_id][destination] = bandwidth_mbps
+        elif "corrupt" in decoded_line.lower():
+            input_stats["corrupt_warnings"] += 1
+        elif "Slave muxer" in decoded_line:
+            # A single tee destination failed; the relay keeps feeding the others
+            output_stats["errors"] += 1
+            output_stats["last_error"] = decoded_line
+            logger.warning(f"Relay stream {stream_id} lost a destination: {decoded_line}")
+            errors.append(decoded_line)
+        elif decoded_line and "=" not in decoded_line.split(" ", 1)[0]:
+            errors.append(decoded_line)
+            if len(errors) > max_error_lines:
+                errors.pop(0)
+    return errors
+
+
+def start_relay_stream(source_url, destinations, duration, stream_id, redundant=False):
+    """
+    Relays a live source (SRT, UDP or HLS) straight to the destinations with stream copy.
+    Nothing is written to disk; the ffmpeg process is restarted whenever the source drops.
+    """
+    if stream_status.get(stream_id, {}).get("status") == "Stream stopped":
+        logger.info(f"Relay stream {stream_id} was stopped before it started.")
+        return
+
+    if isinstance(destinations, str):
+        destinations = [destinations]
+
+    if redundant and len(destinations) == 2:
+        # Same remote/local srt-live-transmit layers as file streams, so the branch endpoints keep working.
+        remote_ports = [get_free_port(), get_free_port()]
+        local_ports = [get_free_port(), get_free_port()]
+        branches = []
+        for i, remote_dest in enumerate(destinations):
+            remote_cmd = [
+                "srt-live-transmit",
+                f"srt://:{remote_ports[i]}?mode=listener",
+                f"{remote_dest.strip()}?mode=caller"
+            ]
+            # Relay bridges run indefinitely and nothing reads their logs, so don't let pipes fill up
+            remote_proc = subprocess.Popen(remote_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            local_cmd = [
+                "srt-live-transmit",
+                f"srt://:{local_ports[i]}?mode=listener",
+                f"srt://127.0.0.1:{remote_ports[i]}?mode=caller"
+            ]
+            local_proc = subprocess.Popen(local_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            branches.append({"remote_process": remote_proc, "local_process": local_proc,
+                             "destination": remote_dest, "remote_port": remote_ports[i]})
+            logger.info(f"Started relay branch for stream {stream_id} to {remote_dest.strip()} via port {local_ports[i]}")
+        outputs = [f"srt://127.0.0.1:{port}" for port in local_ports]
+        active_streams[stream_id] = {"redundant": True, "branches": branches, "ffmpeg_process": None}
+    else:
+        outputs = destinations
+        active_streams[stream_id] = [None]
+
+    def set_relay_process(proc):
+        stream_processes = active_streams.get(stream_id)
+        if isinstance(stream_processes, dict):
+            stream_processes["ffmpeg_process"] = proc
+        elif stream_processes is not None:
+            stream_processes[0] = proc
+
+    input_stats = stream_status[stream_id]["input"]
+    output_stats = stream_status[stream_id]["output"]
+    relay_cmd = build_relay_command(source_url, outputs)
+
+    def supervise_relay():
+        delay = 1
+        while stream_id in active_streams:
+            proc = subprocess.Popen(relay_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            set_relay_process(proc)
+            if stream_id not in active_streams:
+                # Stream was stopped while the process was being started
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+                break
+
+            started = time.time()
+            errors = monitor_relay_process(proc, stream_id, destinations, output_stats["bytes_sent"])
+            proc.wait()
+
+            if stream_id not in active_streams:
+                break
+
+            # Back off only if the relay could not be held for a meaningful time
+            delay = 1 if time.time() - started > RELAY_RECONNECT_DELAY_MAX else min(delay * 2, RELAY_RECONNECT_DELAY_MAX)
+            output_stats["bitrate_mbps"] = 0
+            last_error = errors[-1] if errors else None
+            if is_relay_output_error(errors, source_url, outputs):
+                if not any("Slave muxer" in line for line in errors):
+                    # Destination failures reported by tee were already counted while running
+                    output_stats["errors"] += 1
+                output_stats["last_error"] = last_error
+                logger.warning(f"Relay output for stream {stream_id} failed (exit code {proc.returncode}): {last_error}; restarting in {delay}s")
+            else:
+                input_stats["state"] = "reconnecting"
+                input_stats["reconnects"] += 1
+                input_stats["last_error"] = last_error
+                logger.warning(f"Relay source {source_url} for stream {stream_id} dropped (exit code {proc.returncode}): {last_error}; reconnecting in {delay}s")
+            time.sleep(delay)
+
+    stream_status[stream_id]["status"] = "Streaming"
+    stream_start_time[stream_id] = time.time()
+    threading.Thread(target=supervise_relay, daemon=True).start()
+    logger.info(f"Started relay stream {stream_id} from {source_url} to {destinations}")
+
+    threading.Timer(duration, stop_ffmpeg_stream, args=[stream_id]).start()
+
+
+def start_relay(request: StreamRequest, stream_id: str, source_url: Optional[str]):
+    """Registers a relay stream and starts it, honouring start_offset."""
+    if not is_relay_source(source_url):
+        raise HTTPException(status_code=400, detail="Relay input requires an srt://, udp:// or HLS (.m3u8) stream_url.")
+
+    stream_status[stream_id] = {
+        "status": "Connecting",
+        "remaining_duration": request.duration,
+        "destination": request.destination,
+        "scheduled_start_time": None,
+        "redundant": request.redundant,
+        "file": source_url,
+        "input": {
+            "source": source_url,
+            "state": "connecting",
+            "connected_at": None,
+            "reconnects": 0,
+            "corrupt_warnings": 0,
+            "last_error": None
+        },
+        # Taken from ffmpeg's progress report, which describes what is written to the destinations
+        "output": {
+            "bitrate_mbps": 0,
+            "bytes_sent": 0,
+            "session_time": 0,
+            "speed": None,
+            "errors": 0,
+            "last_error": None
+        }
+    }
+
+    relay_args = (source_url, request.destination, request.duration, stream_id, request.redundant)
+    if request.start_offset > 0:
+        logger.info(f"Scheduling relay stream {stream_id} to start in {request.start_offset} seconds.")
+        stream_status[stream_id]["status"] = "Scheduled"
+        stream_status[stream_id]["scheduled_start_time"] = datetime.utcnow().isoformat()
+        threading.Timer(request.start_offset, start_relay_stream, args=relay_args).start()
+    else:
+        threading.Thread(target=start_relay_stream, args=relay_args).start()
+
+    return {
+        "status": "success",
+        "stream_id": stream_id,
+        "destination": request.destination,
+        "redundant": request.redundant,
+        "file": source_url,
+        "scheduled_start_time": stream_status[stream_id].get("scheduled_start_time"),
+        "message": "Relay is connecting to the source."
+    }
+
+
 @app.post("/start-stream")
 async def start_stream(request: StreamRequest, api_key: str = Depends(verify_api_key)):
     logger.info(f"Received request to start stream: {request}")
@@ -372,6 +855,11 @@ async def start_stream(request: StreamRequest, api_key: str = Depends(verify_api
     stream_id = str(uuid.uuid4())
     logger.info(f"Generated new stream ID: {stream_id}")
 
+    # A stream_url is only ever relayed; start_relay rejects anything that is not a live source
+    source_url = request.stream_url or request.file
+    if request.input_type == "relay" or request.stream_url or (request.input_type == "url" and is_relay_source(source_url)):
+        return start_relay(request, stream_id, source_url)
+
     # Determine file to use
     if request.file:
         file_to_use = request.file
@@ -421,6 +909,7 @@ async def start_stream(request: StreamRequest, api_key: str = Depends(verify_api
         "destination": request.destination,
         "redundant": request.redundant,
         "file": stream_status[stream_id]["file"],  # Return the filename
+        "media": media_index.get(file_to_use) if load_media_index() else None,  # Probe metadata for cost estimation, if indexed
         "scheduled_start_time": stream_status[stream_id].get("scheduled_start_time"),
         "message": "Stream is downloading and will start shortly."
     }
@@ -437,14 +926,21 @@ async def get_bandwidth(stream_id: str, api_key: str = Depends(verify_api_key)):
 
 
 @app.get("/list-media")
-async def list_media_files(api_key: str = Depends(verify_api_key)):
+async def list_media_files(
+    codec: Optional[str] = None,
+    resolution: Optional[str] = None,
+    min_duration: Optional[float] = Query(None, ge=0),
+    max_duration: Optional[float] = Query(None, ge=0),
+    api_key: str = Depends(verify_api_key)
+):
     logger.info("Fetching media files from S3...")
     files = list_s3_files()
     if not files:
         logger.warning("No media files found in S3!")
     else:
         logger.info(f"Retrieved {len(files)} media files from S3: {files}")
-    return {"files": files}
+    media = filter_media_files(files, codec, resolution, min_duration, max_duration)
+    return {"files": [item["file"] for item in media], "media": media}
 
 
 @app.post("/stop-stream/{stream_id}")
@@ -459,17 +955,34 @@ async def stop_stream(stream_id: str, api_key: str = Depends(verify_api_key)):
     return {"status": "stopped", "stream_id": stream_id}
 
 @app.get("/files")
-async def list_s3_files_endpoint(api_key: str = Depends(verify_api_key)):
-    """List all available media files in the S3 bucket."""
+async def list_s3_files_endpoint(
+    codec: Optional[str] = None,
+    resolution: Optional[str] = None,
+    min_duration: Optional[float] = Query(None, ge=0),
+    max_duration: Optional[float] = Query(None, ge=0),
+    api_key: str = Depends(verify_api_key)
+):
+    """List all available media files in the S3 bucket together with their probe metadata."""
     logger.info("Fetching media files from S3...")
     files = list_s3_files()
     
     if not files:
         logger.warning("No media files found in S3!")
-        return {"files": []}
+        return {"files": [], "media": []}
 
     logger.info(f"Retrieved {len(files)} media files from S3: {files}")
-    return {"files": files}
+    media = filter_media_files(files, codec, resolution, min_duration, max_duration)
+    return {"files": [item["file"] for item in media], "media": media}
+
+@app.post("/media-index/backfill")
+async def backfill_media_index_endpoint(background_tasks: BackgroundTasks, force: bool = False, api_key: str = Depends(verify_api_key)):
+    """Probes existing S3 objects that are missing from the media index, or all of them with force=true."""
+    global media_index_backfill_running
+    if media_index_backfill_running:
+        raise HTTPException(status_code=409, detail="Media index backfill is already running")
+    media_index_backfill_running = True
+    background_tasks.add_task(backfill_media_index, force)
+    return {"status": "started", "force": force}
 
 ALLOWED_EXTENSIONS = {".mp4", ".mkv", ".mxf", ".mov", ".avi"}
 
@@ -488,10 +1001,13 @@ async def upload_file(
     # Verify API Key
     if not api_key:
         raise HTTPException(status_code=403, detail="Invalid API key")
+    if file.filename == MEDIA_INDEX_KEY:
+        raise HTTPException(status_code=400, detail="Filename is reserved for the media index")
 
     try:
         # Upload file to S3
         s3_client.upload_fileobj(file.file, AWS_S3_BUCKET, file.filename)
+        background_tasks.add_task(index_media_file, file.filename)
 
         expiry_time = None
         if expire_time:
@@ -518,6 +1034,11 @@ def schedule_file_deletion(filename: str, expiry_time: datetime):
         s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=filename)
         print(f"File {filename} expired and was deleted from S3.")
         file_expiry_map.pop(filename, None)  # Remove from expiry tracking
+        if load_media_index():
+            with media_index_lock:
+                removed = media_index.pop(filename, None)
+            if removed:
+                save_media_index()
     except Exception as e:
         print(f"Error deleting expired file {filename}: {e}")
 
@@ -599,7 +1120,8 @@ async def restart_source(stream_id: str, branch: Literal["primary", "secondary"]
         f"srt://:{remote_port}?mode=listener",
         f"{restart_dest.strip()}?mode=caller"
     ]
-    remote_proc = subprocess.Popen(remote_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Nothing reads the bridge logs, and relay streams keep this process running indefinitely
+    remote_proc = subprocess.Popen(remote_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
     # Update the active streams dictionary with the new remote process.
     chosen_branch["remote_process"] = remote_proc